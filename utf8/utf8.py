@@ -1,5 +1,5 @@
 """
-utf8.decode(…): The world's slowest UTF-8 decoder function.
+utf8.decode_slow(…): The world's slowest UTF-8 decoder function.
 
 Code to demonstrate one (mis)use of pattern matching in Python.
 
@@ -11,24 +11,56 @@ of bit patterns, like Erlang has:
 
 https://erlang.org/doc/programming_examples/bit_syntax.html
 
-Meanwhile, the `decode` function expands bytes into lists of
-bits. That makes everything super slow, but allows the use of
-`match/case` with a list of bits as the subject.
+Meanwhile, the `decode_slow` function expands the leading byte of
+each sequence into a list of bits. That makes everything super slow,
+but allows the use of `match/case` with a list of bits as the subject.
 
-The `encode` function is not as slow.
+The `encode_slow` function is not as slow. It spells out each
+sequence size in its own branch; `encode` computes the size with
+comparisons and looks up the lead bits and shifts in small tables.
 
 Anyway, this kind of bit twiddling is much faster in C, Rust,
 Go, Pascal, etc. (basically, any language that compiles to
 machine code) because the bitwise operations `>>`, `|`,
 `&` are native instructions in any real CPU.
 
-Rewriting `decode` to use bitwise operators is left as an
-exercise for the reader. My goal was to see how `decode`
-would look like using pattern matching.
+The `decode_demo` function is the solution to the exercise of
+rewriting `decode_slow` with bitwise operators: it works directly
+on the integer values of the bytes, without lists of bits.
+
+For real work, use `decode` (also known as `decode_fast`) and
+`encode_fast`: they delegate to the codec implemented in C that ships
+with CPython, which validates and decodes in a single call. The
+hand-written decoders are for reading, or for callers that need to
+work at the level of code points; they are much slower. That goes
+for `validate` too: the fast way to check that bytes are valid UTF-8
+is `try: octets.decode('utf-8')`, which is 20x to 1000x faster than
+running the `re` engine over the input.
 
 """
 
-def unpack(octet: int, width: int = 8) -> list[int]:
+__all__ = ['decode', 'decode_fast', 'encode_fast']
+
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# UTF-32 in native byte order, to decode arrays of code points
+_UTF32 = 'utf-32-le' if sys.byteorder == 'little' else 'utf-32-be'
+
+
+def _unpack(octet: int, width: int) -> list[int]:
     bits = [0] * width
     for i in reversed(range(width)):
         bits[i] = octet & 1
@@ -36,47 +68,303 @@ def unpack(octet: int, width: int = 8) -> list[int]:
     return bits
 
 
+# there are only 256 possible octets: unpack them all once
+_UNPACK = [_unpack(octet, 8) for octet in range(256)]
+_UNPACK6 = [bits[2:] for bits in _UNPACK]
+
+
+def unpack(octet: int, width: int = 8) -> list[int]:
+    if width == 8:
+        return _UNPACK[octet & 0xFF][:]
+    if width == 6:
+        return _UNPACK6[octet & 0xFF][:]
+    return _unpack(octet, width)
+
+
 def pack(bits: list[int]) -> int:
     octet = 0
-    for i, bit in enumerate(reversed(bits)):
-        octet += 2 ** i * bit
+    for bit in bits:
+        octet = octet << 1 | bit
     return octet
 
 
-def decode(octets: bytes) -> str:
-    stream = iter(octets)
+def decode_slow(octets: bytes) -> str:
     out: list[str] = []
-    while True:
+    i, n = 0, len(octets)
+    while i < n:
+        octet = octets[i]
         try:
-            bits = unpack(next(stream))
-        except StopIteration:
-            break
-        try:
-            match bits:
-                case [0, *rest]:                    # 0xxx_xxxx -> 7 bits
-                    out_bits = rest
-                case [1, 1, 0, *head]:              # 110x_xxxx
-                    tail = unpack(next(stream), 6)  # 10xx_xxxx -> 11 bits
-                    out_bits = head + tail
-                case [1, 1, 1, 0, *head]:           # 1110_xxxx
-                    body = unpack(next(stream), 6)  # 10xx_xxxx
-                    tail = unpack(next(stream), 6)  # 10xx_xxxx -> 16 bits
-                    out_bits = head + body + tail
-                case [1, 1, 1, 1, 0, *head]:        # 1111_0xxx
-                    neck = unpack(next(stream), 6)  # 10xx_xxxx
-                    body = unpack(next(stream), 6)  # 10xx_xxxx
-                    tail = unpack(next(stream), 6)  # 10xx_xxxx -> 21 bits
-                    out_bits = head + neck + body + tail
+            match _UNPACK[octet]:
+                case [0, *_]:                       # 0xxx_xxxx -> 7 bits
+                    code = octet
+                    i += 1
+                case [1, 1, 0, *_]:                 # 110x_xxxx
+                    tail = octets[i + 1] & 0b11_1111  # 10xx_xxxx -> 11 bits
+                    code = (octet & 0b1_1111) << 6 | tail
+                    i += 2
+                case [1, 1, 1, 0, *_]:              # 1110_xxxx
+                    body = octets[i + 1] & 0b11_1111  # 10xx_xxxx
+                    tail = octets[i + 2] & 0b11_1111  # 10xx_xxxx -> 16 bits
+                    code = (octet & 0b1111) << 12 | body << 6 | tail
+                    i += 3
+                case [1, 1, 1, 1, 0, *_]:           # 1111_0xxx
+                    neck = octets[i + 1] & 0b11_1111  # 10xx_xxxx
+                    body = octets[i + 2] & 0b11_1111  # 10xx_xxxx
+                    tail = octets[i + 3] & 0b11_1111  # 10xx_xxxx -> 21 bits
+                    code = ((octet & 0b111) << 18 | neck << 12
+                            | body << 6 | tail)
+                    i += 4
                 case _:
-                    bit_str = f'{pack(bits):_b}'
+                    bit_str = f'{octet:_b}'
                     raise ValueError(f'Invalid UTF-8 start pattern: {bit_str}')
-        except StopIteration:
+        except IndexError:
             raise ValueError('Incomplete UTF-8 byte sequence')
-        out.append(chr(pack(out_bits)))
+        out.append(chr(code))
     return ''.join(out)
 
 
-def encode(text: str) -> bytes:
+def decode_demo(octets: bytes) -> str:
+    return _decode(octets, _LEAD_SIZE)
+
+
+def decode_bmp(octets: bytes) -> str:
+    """Like `decode_demo`, but rejects code points beyond U+FFFF."""
+    return _decode(octets, _BMP_LEAD_SIZE)
+
+
+def decode_ascii(octets: bytes) -> str:
+    return octets.decode('ascii')
+
+
+def _decode(octets: bytes, lead_size: bytes) -> str:
+    view = memoryview(octets)  # slices of a memoryview do not copy
+    if np is not None:
+        # find the first non-ASCII byte with one vectorized scan
+        high = np.frombuffer(view, dtype=np.uint8) >= 0x80
+        k = int(high.argmax()) if len(high) else 0
+        if len(high) == 0 or not high[k]:
+            return str(view, 'ascii')
+        return str(view[:k], 'ascii') + _decode_scalar(view[k:], lead_size)
+    return _decode_scalar(view, lead_size)
+
+
+# sequence size and payload mask for each leading byte; size 0 means
+# the byte cannot start a sequence
+_LEAD_SIZE = bytes(
+    [1] * 0x80 +                                     # 0xxx_xxxx
+    [0] * 0x40 +                                     # 10xx_xxxx
+    [2] * 0x20 +                                     # 110x_xxxx
+    [3] * 0x10 +                                     # 1110_xxxx
+    [4] * 0x08 +                                     # 1111_0xxx
+    [0] * 0x08                                       # 1111_1xxx
+)
+_LEAD_MASK = bytes(
+    (0, 0b111_1111, 0b1_1111, 0b1111, 0b111)[size] for size in _LEAD_SIZE
+)
+# no 4-byte sequences in the Basic Multilingual Plane
+_BMP_LEAD_SIZE = _LEAD_SIZE[:0xF0] + bytes(0x10)
+
+
+def _decode_scalar(view: memoryview, lead_size: bytes) -> str:
+    out: list[str] = []
+    i, n = 0, len(view)
+    while i < n:
+        b = view[i]
+        if b < 0x80:                                 # 0xxx_xxxx
+            out.append(chr(b))
+            i += 1
+            continue
+        size = lead_size[b]
+        if not size:
+            raise ValueError(f'Invalid UTF-8 start pattern: {b:_b}')
+        if i + size > n:
+            raise ValueError('Incomplete UTF-8 byte sequence')
+        code = b & _LEAD_MASK[b]
+        code = code << 6 | view[i + 1] & 0b11_1111   # 10xx_xxxx
+        if size > 2:
+            code = code << 6 | view[i + 2] & 0b11_1111
+            if size > 3:
+                code = code << 6 | view[i + 3] & 0b11_1111
+                if code > 0x10_FFFF:
+                    bit_str = ' '.join(f'{b:_b}' for b in view[i:i + 4])
+                    raise ValueError(
+                        f'UTF-8 sequence beyond U+10FFFF: {bit_str}')
+        i += size
+        out.append(chr(code))
+    return ''.join(out)
+
+
+# Björn Höhrmann's UTF-8 DFA: https://bjoern.hoehrmann.de/utf-8/decoder/dfa/
+# Each octet maps to one of 12 classes; the state is an offset into
+# the transition table, which has one row of 12 entries per state.
+# Unlike `decode_demo`, it rejects overlong forms, surrogates and code
+# points beyond U+10FFFF.
+
+_DFA_CLASS = bytes(
+    [0] * 0x80 +                            # 00..7F
+    [1] * 0x10 + [9] * 0x10 + [7] * 0x20 +  # 80..8F, 90..9F, A0..BF
+    [8] * 2 + [2] * 30 +                    # C0..C1, C2..DF
+    [10] + [3] * 12 + [4] + [3] * 2 +       # E0, E1..EC, ED, EE..EF
+    [11] + [6] * 3 + [5] + [8] * 11         # F0, F1..F3, F4, F5..FF
+)
+
+_DFA_STATE = bytes([
+     0, 12, 24, 36, 60, 96, 84, 12, 12, 12, 48, 72,  # accept
+    12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12,  # reject
+    12,  0, 12, 12, 12, 12, 12,  0, 12,  0, 12, 12,  # 1 more byte
+    12, 24, 12, 12, 12, 12, 12, 24, 12, 24, 12, 12,  # 2 more bytes
+    12, 12, 12, 12, 12, 12, 12, 24, 12, 12, 12, 12,  # after E0
+    12, 24, 12, 12, 12, 12, 12, 12, 12, 24, 12, 12,  # after ED
+    12, 12, 12, 12, 12, 12, 12, 36, 12, 36, 12, 12,  # after F0
+    12, 36, 12, 12, 12, 12, 12, 36, 12, 36, 12, 12,  # 3 more bytes
+    12, 36, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12,  # after F4
+])
+
+_DFA_ACCEPT, _DFA_REJECT = 0, 12
+
+
+def decode_dfa(octets: bytes) -> str:
+    out: list[str] = []
+    state = code = 0
+    for b in octets:
+        kind = _DFA_CLASS[b]
+        if state == _DFA_ACCEPT:
+            code = 0xFF >> kind & b
+            state = _DFA_STATE[kind]
+            if state == _DFA_REJECT:
+                raise ValueError(f'Invalid UTF-8 start pattern: {b:_b}')
+        else:
+            code = code << 6 | b & 0b11_1111
+            state = _DFA_STATE[state + kind]
+            if state == _DFA_REJECT:
+                raise ValueError('Invalid UTF-8 byte sequence')
+        if state == _DFA_ACCEPT:
+            # no cache for chr, here or in `_decode_scalar`: CPython
+            # already keeps one str per code point below 256, and a dict
+            # lookup costs about as much as chr for the rest
+            out.append(chr(code))
+    if state != _DFA_ACCEPT:
+        raise ValueError('Incomplete UTF-8 byte sequence')
+    return ''.join(out)
+
+
+try:
+    from utf8_fast import decode_c  # build with: cythonize -i -3 utf8_fast.pyx
+except ImportError:
+    decode_c = decode_dfa
+
+
+# smallest chunk worth handing to a thread
+_MIN_CHUNK = 1 << 16
+
+
+def decode_parallel(octets: bytes, workers: int | None = None) -> str:
+    """Decode chunks of `octets` with `decode_c` in a pool of threads.
+
+    UTF-8 is self-synchronizing: any byte that is not 10xx_xxxx starts
+    a sequence, so the input can be split there. The compiled
+    `decode_c` releases the GIL, so the chunks are decoded in parallel.
+    When the extension is not built, `decode_c` is `decode_dfa`, which
+    holds the GIL; then the input is decoded serially in the caller's
+    thread, since a pool would only add overhead.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    elif workers < 1:
+        raise ValueError(f'workers must be at least 1, got {workers}')
+    view = memoryview(octets)
+    if decode_c is decode_dfa:
+        return decode_dfa(view)
+    n = len(view)
+    parts = min(workers, max(n // _MIN_CHUNK, 1))
+    bounds = [0]
+    for part in range(1, parts):
+        i = part * n // parts
+        while i < n and view[i] & 0b1100_0000 == 0b1000_0000:
+            i += 1
+        if bounds[-1] < i < n:
+            bounds.append(i)
+    bounds.append(n)
+    if len(bounds) == 2:
+        return decode_c(view)
+    chunks = [view[a:b] for a, b in zip(bounds, bounds[1:])]
+    with ThreadPoolExecutor(workers) as pool:
+        return ''.join(pool.map(decode_c, chunks))
+
+
+# the well-formed byte sequences of the Unicode Standard, table 3-7
+_UTF8_RE = re.compile(rb"""(?:
+    [\x00-\x7F]
+  | [\xC2-\xDF][\x80-\xBF]
+  | \xE0[\xA0-\xBF][\x80-\xBF]
+  | [\xE1-\xEC\xEE\xEF][\x80-\xBF]{2}
+  | \xED[\x80-\x9F][\x80-\xBF]
+  | \xF0[\x90-\xBF][\x80-\xBF]{2}
+  | [\xF1-\xF3][\x80-\xBF]{3}
+  | \xF4[\x80-\x8F][\x80-\xBF]{2}
+)*""", re.VERBOSE)
+
+
+def validate(octets: bytes) -> bool:
+    """Check that `octets` is valid UTF-8 without building a `str`.
+
+    This is a demo of the well-formed sequences table as a regex; it is
+    much slower than `try: octets.decode('utf-8')`, which validates in C.
+    """
+    return _UTF8_RE.fullmatch(octets) is not None
+
+
+if numba is not None:
+
+    @numba.njit(cache=True)
+    def _decode_kernel(buf):
+        """Same algorithm as `decode_demo`, compiled to machine code.
+
+        Return the decoded code points and the index where decoding
+        stopped: `len(buf)` on success, or the leading byte of the
+        first invalid or incomplete sequence.
+        """
+        out = np.empty(len(buf), dtype=np.int32)
+        i, k, n = 0, 0, len(buf)
+        while i < n:
+            b = buf[i]
+            if b < 0x80:
+                out[k] = b
+                i += 1
+                k += 1
+                continue
+            if b < 0xC0:
+                return out[:k], i
+            if b < 0xE0:
+                size, code = 1, b & 0b1_1111
+            elif b < 0xF0:
+                size, code = 2, b & 0b1111
+            elif b < 0xF8:
+                size, code = 3, b & 0b111
+            else:
+                return out[:k], i
+            if i + 1 + size > n:
+                return out[:k], i
+            for j in range(i + 1, i + 1 + size):
+                code = code << 6 | buf[j] & 0b11_1111
+            if code > 0x10_FFFF:
+                return out[:k], i
+            out[k] = code
+            i += 1 + size
+            k += 1
+        return out[:k], n
+
+
+def decode_jit(octets: bytes) -> str:
+    if numba is None:
+        return decode_demo(octets)
+    codes, stop = _decode_kernel(np.frombuffer(octets, dtype=np.uint8))
+    if stop < len(octets):
+        decode_demo(memoryview(octets)[stop:])  # raises the same error
+    return codes.tobytes().decode(_UTF32, 'surrogatepass')
+
+
+def encode_slow(text: str) -> bytes:
     out = bytearray()
     for char in text:
         code = ord(char)
@@ -85,16 +373,75 @@ def encode(text: str) -> bytes:
         elif 0x80 <= code < 0x800:
             head = code >> 6 | 0b1100_0000               # 110x_xxxx
             tail = code & 0b11_1111 | 0b1000_0000        # 10xx_xxxx
-            out.extend([head, tail])
+            out += bytes((head, tail))
         elif 0x800 <= code < 0x1_0000:
             head = code >> 12 | 0b1110_0000              # 1110_xxxx
             body = code >> 6 & 0b11_1111 | 0b1000_0000   # 10xx_xxxx
             tail = code & 0b11_1111 | 0b1000_0000        # 10xx_xxxx
-            out.extend([head, body, tail])
+            out += bytes((head, body, tail))
         else:
             head = code >> 18 | 0b1111_0000              # 1111_0xxx
             neck = code >> 12 & 0b11_1111 | 0b1000_0000  # 10xx_xxxx
             body = code >> 6 & 0b11_1111 | 0b1000_0000   # 10xx_xxxx
             tail = code & 0b11_1111 | 0b1000_0000        # 10xx_xxxx
-            out.extend([head, neck, body, tail])
+            out += bytes((head, neck, body, tail))
     return bytes(out)
+
+
+# lead bits and continuation byte shifts for each sequence size
+_LEAD_BITS = (0, 0, 0b1100_0000, 0b1110_0000, 0b1111_0000)
+_TAIL_SHIFTS = ((), (), (0,), (6, 0), (12, 6, 0))
+
+
+def encode(text: str) -> bytes:
+    out = bytearray()
+    for char in text:
+        code = ord(char)
+        if code < 0x80:                                  # 0xxx_xxxx
+            out.append(code)
+            continue
+        size = 2 + (code >= 0x800) + (code >= 0x1_0000)
+        out.append(code >> 6 * (size - 1) | _LEAD_BITS[size])
+        for shift in _TAIL_SHIFTS[size]:                 # 10xx_xxxx
+            out.append(code >> shift & 0b11_1111 | 0b1000_0000)
+    return bytes(out)
+
+
+def encode_numpy(text: str) -> bytes:
+    """Same algorithm as `encode`, applied to all code points at once."""
+    if np is None:
+        return encode(text)
+    try:
+        codes = np.frombuffer(text.encode(_UTF32), dtype=np.uint32)
+    except UnicodeEncodeError:  # lone surrogates
+        return encode(text)
+    sizes = 1 + (codes >= 0x80) + (codes >= 0x800) + (codes >= 0x1_0000)
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    out = np.empty(ends[-1] if len(ends) else 0, dtype=np.uint8)
+    heads = [0, 0b1100_0000, 0b1110_0000, 0b1111_0000]
+    for size, head in enumerate(heads, 1):
+        selected = sizes == size
+        code, pos = codes[selected], starts[selected]
+        shift = 6 * (size - 1)
+        out[pos] = code >> shift | head
+        for offset in range(1, size):                     # 10xx_xxxx
+            shift -= 6
+            out[pos + offset] = code >> shift & 0b11_1111 | 0b1000_0000
+    return out.tobytes()
+
+
+# CPython's UTF-8 codec is written in C, and its decoder has a fast
+# path that checks whole machine words for ASCII bytes at a time.
+# One call to it replaces the whole Python loop in `decode_demo` or
+# `encode`.
+
+def decode_fast(octets: bytes) -> str:
+    return octets.decode('utf-8')
+
+
+decode = decode_fast
+
+
+def encode_fast(text: str) -> bytes:
+    return text.encode('utf-8')
@@ -0,0 +1,108 @@
+# cython: language_level=3
+"""
+utf8_fast.decode_c(…): `utf8.decode_dfa` compiled to C with Cython.
+
+Same DFA, same tables, same errors, but the loop runs over a C array
+of `unsigned char` and writes `Py_UCS4` code points into a buffer
+that becomes a `str` with a single call to the C API.
+
+Build it in place with::
+
+    cythonize -i -3 utf8_fast.pyx
+
+When the extension is not built, `utf8.decode_c` is `utf8.decode_dfa`.
+
+"""
+
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+from cpython.unicode cimport PyUnicode_FromKindAndData, PyUnicode_4BYTE_KIND
+
+# same tables as `utf8._DFA_CLASS` and `utf8._DFA_STATE`
+
+cdef bytes _DFA_CLASS = bytes(
+    [0] * 0x80 +                            # 00..7F
+    [1] * 0x10 + [9] * 0x10 + [7] * 0x20 +  # 80..8F, 90..9F, A0..BF
+    [8] * 2 + [2] * 30 +                    # C0..C1, C2..DF
+    [10] + [3] * 12 + [4] + [3] * 2 +       # E0, E1..EC, ED, EE..EF
+    [11] + [6] * 3 + [5] + [8] * 11         # F0, F1..F3, F4, F5..FF
+)
+
+cdef bytes _DFA_STATE = bytes([
+     0, 12, 24, 36, 60, 96, 84, 12, 12, 12, 48, 72,  # accept
+    12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12,  # reject
+    12,  0, 12, 12, 12, 12, 12,  0, 12,  0, 12, 12,  # 1 more byte
+    12, 24, 12, 12, 12, 12, 12, 24, 12, 24, 12, 12,  # 2 more bytes
+    12, 12, 12, 12, 12, 12, 12, 24, 12, 12, 12, 12,  # after E0
+    12, 24, 12, 12, 12, 12, 12, 12, 12, 24, 12, 12,  # after ED
+    12, 12, 12, 12, 12, 12, 12, 36, 12, 36, 12, 12,  # after F0
+    12, 36, 12, 12, 12, 12, 12, 36, 12, 36, 12, 12,  # 3 more bytes
+    12, 36, 12, 12, 12, 12, 12, 12, 12, 12, 12, 12,  # after F4
+])
+
+cdef const unsigned char* CLASS = _DFA_CLASS
+cdef const unsigned char* STATE = _DFA_STATE
+
+cdef enum:
+    ACCEPT = 0
+    REJECT = 12
+    INVALID_START = -1
+    INVALID_SEQUENCE = -2
+    INCOMPLETE = -3
+
+
+cdef Py_ssize_t _decode(const unsigned char* buf, Py_ssize_t n,
+                        Py_UCS4* out, Py_ssize_t* pos) noexcept nogil:
+    """Return the number of code points written to `out`, or a
+    negative error code with the offending index in `pos[0]`."""
+    cdef Py_ssize_t i
+    cdef Py_ssize_t k = 0
+    cdef unsigned int state = ACCEPT
+    cdef unsigned int code = 0
+    cdef unsigned int kind
+    cdef unsigned char b
+    for i in range(n):
+        b = buf[i]
+        kind = CLASS[b]
+        if state == ACCEPT:
+            code = (0xFF >> kind) & b
+            state = STATE[kind]
+            if state == REJECT:
+                pos[0] = i
+                return INVALID_START
+        else:
+            code = (code << 6) | (b & 0b11_1111)
+            state = STATE[state + kind]
+            if state == REJECT:
+                pos[0] = i
+                return INVALID_SEQUENCE
+        if state == ACCEPT:
+            out[k] = code
+            k += 1
+    if state != ACCEPT:
+        pos[0] = n
+        return INCOMPLETE
+    return k
+
+
+def decode_c(const unsigned char[::1] octets) -> str:
+    cdef Py_ssize_t n = octets.shape[0]
+    cdef Py_ssize_t pos = 0
+    cdef Py_ssize_t count
+    cdef Py_UCS4* out
+    if n == 0:
+        return ''
+    out = <Py_UCS4*> PyMem_Malloc(n * sizeof(Py_UCS4))
+    if out == NULL:
+        raise MemoryError()
+    try:
+        with nogil:
+            count = _decode(&octets[0], n, out, &pos)
+        if count == INVALID_START:
+            raise ValueError(f'Invalid UTF-8 start pattern: {octets[pos]:_b}')
+        if count == INVALID_SEQUENCE:
+            raise ValueError('Invalid UTF-8 byte sequence')
+        if count == INCOMPLETE:
+            raise ValueError('Incomplete UTF-8 byte sequence')
+        return PyUnicode_FromKindAndData(PyUnicode_4BYTE_KIND, out, count)
+    finally:
+        PyMem_Free(out)
@@ -2,7 +2,18 @@ import sys
 
 import pytest
 
-from utf8 import unpack, pack, decode, encode
+import utf8
+from utf8 import unpack, pack, decode_slow, decode_demo, encode_slow, encode
+from utf8 import decode, encode_fast, decode_jit, decode_dfa, encode_numpy
+from utf8 import decode_c, validate, decode_bmp, decode_ascii, decode_parallel
+
+DECODERS = [decode_slow, decode_demo, decode_jit]
+STRICT_DECODERS = [
+    decode_dfa,
+    pytest.param(decode_c, marks=pytest.mark.skipif(
+        decode_c is decode_dfa, reason='utf8_fast not built')),
+]
+ENCODERS = [encode_slow, encode, encode_fast, encode_numpy]
 
 BIT_PATTERNS = [
     (0,   [0, 0, 0, 0, 0, 0, 0, 0]),
@@ -18,42 +29,217 @@ def test_unpack(octet, expected):
     got = unpack(octet)
     assert got == expected
 
+@pytest.mark.parametrize('octet, expected', [
+    (0b1000_0000, [0, 0, 0, 0, 0, 0]),
+    (0b1011_0101, [1, 1, 0, 1, 0, 1]),
+    (0b1111_1111, [1, 1, 1, 1, 1, 1]),
+])
+def test_unpack_6_bits(octet, expected):
+    got = unpack(octet, 6)
+    assert got == expected
+
 @pytest.mark.parametrize('expected, bits', BIT_PATTERNS)
 def test_pack(expected, bits):
     got = pack(bits)
     assert got == expected
 
+@pytest.mark.parametrize('decode', DECODERS + STRICT_DECODERS + [decode])
 @pytest.mark.parametrize('expected', [
     'A', 'á', '…', '\N{cat}',
 ])
-def test_decode(expected):
+def test_decode(decode, expected):
     got = decode(expected.encode('utf8'))
     assert got == expected
 
+@pytest.mark.parametrize('decode', DECODERS + STRICT_DECODERS + [decode])
+@pytest.mark.parametrize('expected', [
+    '', 'ASCII only', 'café', 'Ação…', 'The \N{cat} sat on the mat',
+])
+def test_decode_text(decode, expected):
+    got = decode(expected.encode('utf8'))
+    assert got == expected
+
+@pytest.mark.parametrize('encode', ENCODERS)
 @pytest.mark.parametrize('expected', [
     'A', 'á', '…', '\N{cat}',
 ])
-def test_encode(expected):
+def test_encode(encode, expected):
     got = encode(expected)
     assert got == expected.encode('utf8')
 
 
-def test_invalid_bit_pattern():
+@pytest.mark.parametrize('decode', DECODERS + STRICT_DECODERS)
+def test_invalid_bit_pattern(decode):
     expected = 'Invalid UTF-8 start pattern: 1000_0000'
     with pytest.raises(ValueError) as excinfo:
         decode(bytes([0b1000_0000]))
     assert expected in str(excinfo.value)
 
 
-def test_incomplete_byte_sequence():
+@pytest.mark.parametrize('decode', DECODERS + STRICT_DECODERS)
+def test_invalid_bit_pattern_after_ascii(decode):
+    expected = 'Invalid UTF-8 start pattern: 1000_0000'
+    with pytest.raises(ValueError) as excinfo:
+        decode(b'0123456789ABCDEF' + bytes([0b1000_0000]) + b'tail')
+    assert expected in str(excinfo.value)
+
+
+@pytest.mark.parametrize('decode', DECODERS)
+def test_incomplete_byte_sequence(decode):
     expected = 'Incomplete UTF-8 byte sequence'
     with pytest.raises(ValueError) as excinfo:
         decode(bytes([0b1100_0000]))
     assert expected in str(excinfo.value)
 
 
+@pytest.mark.parametrize('encode', ENCODERS)
+@pytest.mark.parametrize('text', [
+    '', 'ASCII only', 'café', 'Ação…', 'The \N{cat} sat on the mat',
+])
+def test_encode_text(encode, text):
+    got = encode(text)
+    assert got == text.encode('utf8')
+
+
+def test_encode_numpy_surrogate():
+    assert encode_numpy('\ud800') == encode('\ud800') == b'\xed\xa0\x80'
+
+
+LONG_TEXT = 'Ação… \N{cat} ' * 20_000  # 340_000 bytes in UTF-8
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_decode_parallel(workers):
+    got = decode_parallel(LONG_TEXT.encode('utf8'), workers)
+    assert got == LONG_TEXT
+
+
+def test_decode_parallel_serial_without_extension(monkeypatch):
+    def no_pool(workers):
+        raise AssertionError('thread pool used without the extension')
+    monkeypatch.setattr(utf8, 'decode_c', utf8.decode_dfa)
+    monkeypatch.setattr(utf8, 'ThreadPoolExecutor', no_pool)
+    got = decode_parallel(LONG_TEXT.encode('utf8'), 4)
+    assert got == LONG_TEXT
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    """Run decode_parallel's split and pool path even without utf8_fast."""
+    seen = []
+    def decode_chunk(view):
+        seen.append(view)
+        return decode_dfa(view)
+    monkeypatch.setattr(utf8, 'decode_c', decode_chunk)
+    monkeypatch.setattr(utf8, '_MIN_CHUNK', 1)
+    return seen
+
+
+@pytest.mark.parametrize('workers', [1, 2, 3, 7])
+def test_decode_parallel_chunks(chunks, workers):
+    got = decode_parallel(LONG_TEXT.encode('utf8'), workers)
+    assert got == LONG_TEXT
+    assert len(chunks) == workers
+    for chunk in chunks:
+        assert chunk[0] & 0b1100_0000 != 0b1000_0000
+
+
+def test_decode_parallel_chunks_invalid(chunks):
+    octets = LONG_TEXT.encode('utf8')
+    octets = octets[:300_000] + bytes([0b1000_0000]) + octets[300_000:]
+    with pytest.raises(ValueError):
+        decode_parallel(octets, 3)  # the invalid byte is in the last chunk
+    assert len(chunks) == 3
+
+
+@pytest.mark.parametrize('workers', [0, -1])
+def test_decode_parallel_invalid_workers(workers):
+    with pytest.raises(ValueError) as excinfo:
+        decode_parallel(b'', workers)
+    assert 'workers must be at least 1' in str(excinfo.value)
+
+
+def test_decode_parallel_invalid():
+    octets = LONG_TEXT.encode('utf8')
+    octets = octets[:200_000] + bytes([0b1000_0000]) + octets[200_000:]
+    with pytest.raises(ValueError):
+        decode_parallel(octets, 4)
+
+
+@pytest.mark.parametrize('expected', ['A', 'á', '…', 'Ação…', '\uffff'])
+def test_decode_bmp(expected):
+    got = decode_bmp(expected.encode('utf8'))
+    assert got == expected
+
+
+def test_decode_bmp_rejects_astral():
+    expected = 'Invalid UTF-8 start pattern: 1111_0000'
+    with pytest.raises(ValueError) as excinfo:
+        decode_bmp('\N{cat}'.encode('utf8'))
+    assert expected in str(excinfo.value)
+
+
+def test_decode_ascii():
+    assert decode_ascii(b'ASCII only') == 'ASCII only'
+    with pytest.raises(ValueError):
+        decode_ascii('café'.encode('utf8'))
+
+
+@pytest.mark.parametrize('decode', [decode_demo, decode_jit])
+def test_beyond_max_code_point(decode):
+    expected = ('UTF-8 sequence beyond U+10FFFF: '
+                '1111_0111 1011_1111 1011_1111 1011_1111')
+    with pytest.raises(ValueError) as excinfo:
+        decode(b'A' + bytes([0b1111_0111] + [0b1011_1111] * 3))
+    assert expected in str(excinfo.value)
+
+
+INVALID_SEQUENCES = [
+    b'\xc0\x80',          # overlong NUL
+    b'\xe0\x80\x80',      # overlong NUL
+    b'\xed\xa0\x80',      # surrogate U+D800
+    b'\xf4\x90\x80\x80',  # U+110000
+    b'\xe2\x82A',         # ASCII instead of continuation byte
+    b'\xe2\x82',          # truncated
+]
+
+@pytest.mark.parametrize('octets', INVALID_SEQUENCES)
+@pytest.mark.parametrize('decode', STRICT_DECODERS)
+def test_dfa_invalid_byte_sequence(decode, octets):
+    with pytest.raises(ValueError):
+        decode(octets)
+
+
+@pytest.mark.parametrize('text', [
+    '', 'A', 'á', '…', '\N{cat}', 'Ação…', 'The \N{cat} sat on the mat',
+    '\U0010ffff',
+])
+def test_validate(text):
+    octets = text.encode('utf8')
+    assert validate(octets)
+
+
+@pytest.mark.parametrize('octets', INVALID_SEQUENCES)
+def test_validate_invalid(octets):
+    assert not validate(octets)
+
+
+def test_invalid_sequences_are_invalid():
+    for octets in INVALID_SEQUENCES:
+        with pytest.raises(UnicodeDecodeError):
+            octets.decode('utf8')
+
+
+@pytest.mark.parametrize('decode', STRICT_DECODERS)
+def test_dfa_incomplete_byte_sequence(decode):
+    expected = 'Incomplete UTF-8 byte sequence'
+    with pytest.raises(ValueError) as excinfo:
+        decode(bytes([0b1110_0010, 0b1000_0010]))
+    assert expected in str(excinfo.value)
+
+
 @pytest.mark.slow
-def test_encode_all_chars():
+@pytest.mark.parametrize('encode', ENCODERS)
+def test_encode_all_chars(encode):
     codes = range(0, sys.maxunicode + 1)
     for char in (chr(c) for c in codes):
         try:
@@ -64,7 +250,8 @@ def test_encode_all_chars():
 
 
 @pytest.mark.slow
-def test_decode_all_chars():
+@pytest.mark.parametrize('decode', DECODERS + STRICT_DECODERS)
+def test_decode_all_chars(decode):
     codes = range(0, sys.maxunicode + 1)
     for char in (chr(c) for c in codes):
         try: